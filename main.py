@@ -1,19 +1,39 @@
 import base64
-import datetime
+import functools
 import os
 import sqlite3
 import sys
 from io import BytesIO
-from threading import Lock
-from time import sleep
+from threading import Lock, local
+from time import monotonic, sleep
 
 import flet as ft
 from PIL import Image
 from loguru import logger
 from pyzkfp import ZKFP2
 
+# Capture dimensions of the scanner; adjust for other device models
+IMG_SIZE = (288, 375)
+
+
+@functools.cache
+def _load_asset_b64(path):
+    """Read and base64-encode an asset file, once per process.
+
+    Module-level so the cache outlives any single FingerprintScanner
+    instance (including hot reloads that rebuild the UI).
+    """
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode('ascii')
+
 
 class FingerprintScanner:
+    # Hot SQL kept as class constants so repeated calls hit sqlite3's
+    # per-connection statement cache instead of re-parsing
+    SELECT_ALL_FINGERPRINTS_SQL = 'SELECT user_id, fingerprint_template FROM fingerprints'
+    INSERT_FINGERPRINT_SQL = \
+        'INSERT INTO fingerprints (user_id, fingerprint_template) VALUES (?, ?)'
+
     def __init__(self):
         # Configure loguru logger
         self.zkfp2 = None
@@ -28,12 +48,19 @@ class FingerprintScanner:
         self.fid = 1
         self.keep_alive = True
 
-        # Add a threading lock to make database operations thread-safe
+        # user_ids currently loaded into the device's in-memory database
+        self._loaded_ids = set()
+
+        # Lock for schema DDL only; reads and writes use per-thread
+        # connections, so WAL readers no longer queue behind a writer
         self.db_lock = Lock()
 
-        # Database setup (make thread-safe)
-        self.db_connection = sqlite3.connect('fingerprints.db', check_same_thread=False)
-        self.db_cursor = self.db_connection.cursor()
+        # Reusable in-memory buffer for UI preview encoding; rewound and
+        # truncated between captures instead of allocating a fresh BytesIO
+        self._ui_buf = BytesIO()
+
+        # One SQLite connection per thread, created lazily in _conn()
+        self._tls = local()
         logger.remove()  # Remove any default logger
         logger.add(sys.stdout, format="<white>{time:YYYY-MM-DD HH:mm:ss}</white> | "
                                       "<level>{level: <8}</level> | "
@@ -43,6 +70,65 @@ class FingerprintScanner:
 
         self.logger = logger  # Assign loguru logger to self.logger
 
+        # Encode every Lottie asset once so page builds are dict lookups
+        self._preload_assets()
+
+    @staticmethod
+    def _as_buffer(template):
+        """Return a zero-copy view of a merged template for BLOB binding.
+
+        Falls back to a bytes copy only when the SDK hands back something
+        that does not support the buffer protocol.
+        """
+        try:
+            return memoryview(template)
+        except TypeError:
+            return bytes(template)
+
+    @staticmethod
+    def _asset_base_path():
+        """Return the asset root, accounting for a PyInstaller bundle."""
+        try:
+            return sys._MEIPASS  # The temp folder where PyInstaller bundles files
+        except AttributeError:
+            return os.path.abspath(".")
+
+    def _preload_assets(self):
+        """Warm the asset cache for all Lottie JSON files at startup.
+
+        Route changes then cost a cache lookup instead of a read plus an
+        encode pass.
+        """
+        json_dir = os.path.join(self._asset_base_path(), "assets/json")
+        if not os.path.isdir(json_dir):
+            self.logger.error(f"Asset directory not found: {json_dir}")
+            return
+        for name in os.listdir(json_dir):
+            if name.endswith(".json"):
+                _load_asset_b64(os.path.join(json_dir, name))
+
+    def _conn(self):
+        """Return this thread's SQLite connection, creating it on first use.
+
+        Each connection is tuned once: WAL avoids a full fsync per insert
+        and lets readers run concurrently with a writer, the remaining
+        PRAGMAs keep temp data and the page cache in memory.
+        """
+        conn = getattr(self._tls, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect('fingerprints.db', cached_statements=256)
+            # page_size only applies while the database is still empty;
+            # mmap lets startup reads come out of the page cache without
+            # a read() syscall per page
+            conn.execute('PRAGMA page_size=8192')
+            conn.execute('PRAGMA mmap_size=268435456')
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            conn.execute('PRAGMA cache_size=-20000')
+            self._tls.conn = conn
+        return conn
+
     def connect_to_device(self):
         connected = self.initialize_zkfp2()
         if connected:
@@ -60,45 +146,40 @@ class FingerprintScanner:
         """Load fingerprints from the database and add them to the ZKFP device."""
         self.logger.info("Loading fingerprints from the database and adding to the device.")
 
-        with self.db_lock:
-            self.db_cursor.execute('SELECT user_id, fingerprint_template FROM fingerprints')
-            rows = self.db_cursor.fetchall()
-
-        for row in rows:
-            user_id = row[0]
-            fingerprint_template_base64 = row[1]
+        # Iterate the cursor directly: SQLite hands back rows lazily as the
+        # statement steps, so peak memory stays at a single row's template.
+        # Templates are raw BLOBs and go straight to the device with no
+        # decoding pass; bound methods are hoisted out of the loop.
+        db_add = self.zkfp2.DBAdd
+        mark_loaded = self._loaded_ids.add
+        loaded = 0
+        for user_id, fingerprint_template in self._conn().execute(self.SELECT_ALL_FINGERPRINTS_SQL):
+            db_add(user_id, fingerprint_template)
+            mark_loaded(user_id)
+            loaded += 1
 
-            # Decode the base64 encoded fingerprint template
-            fingerprint_template = base64.b64decode(fingerprint_template_base64)
-
-            # Add the fingerprint to the ZKFP2 device's memory
-            self.add_fingerprint_to_zkfp(user_id, fingerprint_template)
-
-        self.logger.info("All fingerprints from the database have been added to the device.")
+        self.logger.info(f"All {loaded} fingerprints from the database have been added to the device.")
 
     def add_fingerprint_to_zkfp(self, user_id, fingerprint_template):
         """Add the fingerprint template to the ZKFP2 device."""
         self.zkfp2.DBAdd(user_id, fingerprint_template)
+        self._loaded_ids.add(user_id)
         self.logger.info(f"Fingerprint for user {user_id} added to ZKFP2 database.")
 
-    def get_next_user_id(self):
-        """Get the next available user_id by checking the maximum user_id in the database."""
-        with self.db_lock:
-            self.db_cursor.execute('SELECT MAX(user_id) FROM fingerprints')
-            result = self.db_cursor.fetchone()[0]
-            return result + 1 if result else 1  # Start with user_id 1 if no records are found
-
     def setup_database(self):
         """Create the fingerprints table."""
-        with self.db_lock:  # Use the lock to ensure thread-safe access
-            self.db_cursor.execute('''
+        with self.db_lock:  # Serialize schema DDL
+            conn = self._conn()
+            conn.execute('''
                 CREATE TABLE IF NOT EXISTS fingerprints (
-                    user_id INTEGER PRIMARY KEY,
-                    fingerprint_template TEXT,
-                    last_updated TIMESTAMP
+                    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    fingerprint_template BLOB,
+                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
-            self.db_connection.commit()
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_fingerprints_last_updated ON fingerprints (last_updated)')
+            conn.commit()
 
     def initialize_zkfp2(self) -> bool:
         try:
@@ -115,20 +196,31 @@ class FingerprintScanner:
             self.logger.error(f"Failed to initialize ZKFP2 device: {e}")
             return False
 
+    def _acquire_fingerprint(self):
+        """Poll the device until a capture arrives.
+
+        Polls tightly (10 ms) for the first half second so a finger that is
+        already on the sensor is picked up immediately, then backs off to
+        keep idle CPU bounded while waiting.
+        """
+        start = monotonic()
+        while True:
+            capture = self.zkfp2.AcquireFingerprint()
+            if capture:
+                return capture
+            elapsed = monotonic() - start
+            sleep(0.01 if elapsed < 0.5 else 0.05 if elapsed < 3 else 0.2)
+
     def capture_fingerprints(self):
         """Capture three fingerprints and merge them."""
         self.logger.info("Starting fingerprint capture process...")
 
         templates = []
         for i in range(3):
-            while True:
-                capture = self.zkfp2.AcquireFingerprint()
-                if capture:
-                    self.logger.info(f"Fingerprint {i + 1} captured")
-                    tmp, img = capture
-                    self.zkfp2.show_image(img)  # requires Pillow lib
-                    templates.append(tmp)
-                    break
+            tmp, img = self._acquire_fingerprint()
+            self.logger.info(f"Fingerprint {i + 1} captured")
+            self.zkfp2.show_image(img)  # requires Pillow lib
+            templates.append(tmp)
 
         # Merge the three templates into one
         regTemp, regTempLen = self.zkfp2.DBMerge(*templates)
@@ -140,39 +232,72 @@ class FingerprintScanner:
             return None
 
     def register_new_fingerprint(self):
-        """Automatically assign a new user_id and register the fingerprint."""
-        user_id = self.get_next_user_id()  # Automatically get the next user_id
+        """Register the fingerprint, letting SQLite assign the new user_id."""
         regTemp = self.capture_fingerprints()
-        regTemp_bytes = bytes(regTemp)  # Convert to Python bytes
-
-        base64_encoded_data = base64.b64encode(regTemp_bytes)
 
         if regTemp is None:
-            self.logger.error(f"Failed to register fingerprint for user {user_id}")
+            self.logger.error("Failed to register fingerprint")
+            return
+
+        # Save first so the AUTOINCREMENT key allocates the user_id atomically;
+        # _as_buffer avoids copying the template into an intermediate bytes
+        user_id = self.save_fingerprint_to_db(self._as_buffer(regTemp))
+        if user_id is None:
             return
 
         # Add the merged fingerprint template to the ZKFP2 device's database
-        self.zkfp2.DBAdd(user_id, regTemp)
-        self.save_fingerprint_to_db(user_id, base64_encoded_data)
-        self.logger.info(f"Fingerprint for user {user_id} added to ZKFP2 database.")
+        self.add_fingerprint_to_zkfp(user_id, regTemp)
+
+    def save_fingerprint_to_db(self, fingerprint_template):
+        """Save the fingerprint template to the SQLite database.
 
-    def save_fingerprint_to_db(self, user_id, fingerprint_template):
-        """Save the fingerprint template to the SQLite database."""
+        Returns the user_id assigned by the AUTOINCREMENT key, or None on error.
+        """
         try:
-            with self.db_lock:  # Ensure thread-safety
-                self.db_cursor.execute(
-                    'INSERT INTO fingerprints (user_id, fingerprint_template, last_updated) VALUES (?, ?, ?)',
-                    (user_id, fingerprint_template,
-                     datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            conn = self._conn()
+            with conn:  # One transaction per insert, committed on exit
+                cursor = conn.execute(
+                    self.INSERT_FINGERPRINT_SQL,
+                    (None, sqlite3.Binary(fingerprint_template))
                 )
-                self.db_connection.commit()
+                user_id = cursor.lastrowid
             self.logger.info(f"Fingerprint for user {user_id} saved to the local database.")
+            return user_id
         except sqlite3.DatabaseError as e:
-            self.logger.error(f"Failed to save fingerprint for user {user_id}: {e}")
+            self.logger.error(f"Failed to save fingerprint: {e}")
+            return None
 
-    def add_fingerprint_to_zkfp(self, user_id, fingerprint_template):
-        self.zkfp2.DBAdd(user_id, fingerprint_template)
-        self.logger.info(f"Fingerprint for user {user_id} added to ZKFP2 database")
+    def save_fingerprints_to_db(self, rows):
+        """Save many fingerprint templates in a single transaction.
+
+        ``rows`` is an iterable of ``(user_id, fingerprint_template)`` tuples.
+        Batching all inserts under one commit avoids an fsync per fingerprint.
+        """
+        try:
+            conn = self._conn()
+            with conn:
+                conn.executemany(
+                    self.INSERT_FINGERPRINT_SQL,
+                    ((user_id, sqlite3.Binary(template)) for user_id, template in rows)
+                )
+            self.logger.info("Fingerprint batch saved to the local database.")
+        except sqlite3.DatabaseError as e:
+            self.logger.error(f"Failed to save fingerprint batch: {e}")
+
+    def _img_to_base64_preview(self, img):
+        """Encode a raw capture as an uncompressed BMP for the UI preview.
+
+        BMP skips PNG's filter + deflate passes, so updating the preview
+        costs a memcpy instead of a compression run. PNG is still used for
+        the fingerprint image persisted to disk. The shared buffer is
+        reused across captures and frombuffer aliases the raw capture
+        instead of copying it, so no allocations survive the call.
+        """
+        buf = self._ui_buf
+        buf.seek(0)
+        buf.truncate(0)
+        Image.frombuffer("L", IMG_SIZE, img, "raw", "L", 0, 1).save(buf, format="BMP")
+        return base64.b64encode(buf.getvalue()).decode("utf-8")
 
     def show_dialog(self, page, title, message, json_file='failed.json', repeat=True):
         def dismiss_dialog(e):
@@ -219,25 +344,15 @@ class FingerprintScanner:
         )
 
     def get_base64_src(self, json_file):
-        # Check if running in a PyInstaller bundle
+        # Thin wrapper over the process-wide asset cache; _preload_assets
+        # warms it at startup, so this is normally a pure cache hit
+        json_file_path = os.path.join(self._asset_base_path(), f"assets/json/{json_file}")
         try:
-            base_path = sys._MEIPASS  # The temp folder where PyInstaller bundles files
-        except AttributeError:
-            base_path = os.path.abspath(".")
-
-        # Build the full path to the asset
-        json_file_path = os.path.join(base_path, f"assets/json/{json_file}")
-
-        # Check if the file exists
-        if not os.path.exists(json_file_path):
+            return _load_asset_b64(json_file_path)
+        except FileNotFoundError:
             self.logger.error(f"File not found: {json_file_path}")
             return None
 
-        with open(json_file_path, "r", encoding="utf-8") as json_file:
-            json_data = json_file.read()
-
-        return base64.b64encode(json_data.encode('utf-8')).decode('utf-8')
-
     def change_theme_mode(self):
         if self.page.theme_mode == ft.ThemeMode.DARK:
             self.page.theme_mode = ft.ThemeMode.LIGHT
@@ -264,6 +379,11 @@ class FingerprintScanner:
             os.makedirs(image_save_folder)  # Create the folder if it doesn't exist
 
         def start_register(e):
+            # Run the capture loop off the UI thread so polling never
+            # blocks rendering
+            page.run_thread(register_worker)
+
+        def register_worker():
             self.logger.info("Starting fingerprint registration process...")
             text_display.value = "Place your finger on the scanner for the first capture..."
             text_display.update()
@@ -275,63 +395,56 @@ class FingerprintScanner:
             for i in range(3):
                 text_display.value = f"Capturing fingerprint {i + 1} of 3..."
                 text_display.update()
-                while True:
-                    capture = self.zkfp2.AcquireFingerprint()
-                    if capture:
-                        tmp, img = capture  # img is the raw byte data of the fingerprint image
-                        finger_image = img  # Save the last captured image
-                        # Check if the fingerprint already exists in the database
-                        fid, score = self.zkfp2.DBIdentify(tmp)
-                        if fid != 0:
-                            # Fingerprint exists, show message and stop registration
-                            self.show_dialog(page, "Fingerprint Exists",
-                                             f"Fingerprint already registered with User ID: {fid}.",
-                                             json_file='fingernok.json', repeat=False)
-                            self.logger.info(f"Fingerprint already exists for User ID: {fid}")
-                            text_display.value = f"Fingerprint already exists for User ID: {fid}. Registration canceled."
-                            text_display.update()
-                            return  # Stop the registration process
-
-                        # If fingerprint does not exist, proceed with registration
-                        templates.append(tmp)
-
-                        # Display the captured fingerprint image in the UI
-                        buffered = BytesIO()
-                        image = Image.frombytes("L", (288, 375), img)  # Adjust the size according to your device
-                        image.save(buffered, format="PNG")
-                        img_base64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
-
-                        # Update Lottie container to show the captured fingerprint image
-                        lottie_container.content = ft.Image(
-                            src_base64=img_base64,  # Display the captured image
-                        )
-                        lottie_container.update()
-
-                        self.logger.info(f"Fingerprint {i + 1} captured")
-                        text_display.value = f"Fingerprint {i + 1} captured. Remove your finger."
-                        text_display.update()
-                        sleep(1)  # Short pause between captures
-                        break
-                    sleep(0.5)
+                tmp, img = self._acquire_fingerprint()  # img is the raw byte data of the fingerprint image
+                finger_image = img  # Save the last captured image
+                # Check if the fingerprint already exists in the database
+                fid, score = self.zkfp2.DBIdentify(tmp)
+                if fid != 0:
+                    # Fingerprint exists, show message and stop registration
+                    self.show_dialog(page, "Fingerprint Exists",
+                                     f"Fingerprint already registered with User ID: {fid}.",
+                                     json_file='fingernok.json', repeat=False)
+                    self.logger.info(f"Fingerprint already exists for User ID: {fid}")
+                    text_display.value = f"Fingerprint already exists for User ID: {fid}. Registration canceled."
+                    text_display.update()
+                    return  # Stop the registration process
+
+                # If fingerprint does not exist, proceed with registration
+                templates.append(tmp)
+
+                # Update Lottie container to show the captured fingerprint image
+                lottie_container.content = ft.Image(
+                    src_base64=self._img_to_base64_preview(img),  # Display the captured image
+                )
+                lottie_container.update()
+
+                self.logger.info(f"Fingerprint {i + 1} captured")
+                text_display.value = f"Fingerprint {i + 1} captured. Remove your finger."
+                text_display.update()
+                sleep(1)  # Short pause between captures
 
             # Merge the three templates into one
             regTemp, regTempLen = self.zkfp2.DBMerge(*templates)
             if regTemp:
-                user_id = self.get_next_user_id()  # Automatically assign a new user_id
-                regTemp_bytes = bytes(regTemp)
-
-                # Base64 encode the merged fingerprint template
-                base64_encoded_data = base64.b64encode(regTemp_bytes).decode('utf-8')
-
-                # Save the final fingerprint image as a PNG file (only one image)
-                image = Image.frombytes("L", (288, 375), finger_image)
+                # Save to the database first; the AUTOINCREMENT key assigns the
+                # user_id. _as_buffer binds the template without an extra copy.
+                user_id = self.save_fingerprint_to_db(self._as_buffer(regTemp))
+                if user_id is None:
+                    self.show_dialog(page, "Error", "Failed to save fingerprint to the database.")
+                    text_display.value = "Failed to save fingerprint. Try again."
+                    text_display.update()
+                    return
+
+                # Save the final fingerprint image as a PNG file (only one image).
+                # compress_level=1 trades a few KB of file size for a much
+                # faster deflate pass on these small grayscale images.
+                image = Image.frombuffer("L", IMG_SIZE, finger_image, "raw", "L", 0, 1)
                 image_filename = f"{image_save_folder}/user_{user_id}_fingerprint.png"
-                image.save(image_filename)
+                image.save(image_filename, format="PNG", compress_level=1)
                 self.logger.info(f"Final fingerprint image saved as {image_filename}")
 
-                # Add the fingerprint to the ZKFP device and save it to the database
-                self.zkfp2.DBAdd(user_id, regTemp)
-                self.save_fingerprint_to_db(user_id, base64_encoded_data)
+                # Add the fingerprint to the ZKFP device
+                self.add_fingerprint_to_zkfp(user_id, regTemp)
                 self.show_dialog(page, "Registration Success", f"User {user_id} successfully registered.", json_file='fingerok.json', repeat=False)
                 self.logger.info(f"User {user_id} successfully registered.")
                 text_display.value = f"User {user_id} successfully registered!"
@@ -377,62 +490,41 @@ class FingerprintScanner:
         )
 
         def start_identification(e):
+            # Run the capture loop off the UI thread so polling never
+            # blocks rendering
+            page.run_thread(identify_worker)
+
+        def identify_worker():
             self.logger.info("Starting identification process...")
             text_display.value = "Waiting for fingerprint..."
             text_display.update()
             page.update()
 
             # Wait for the fingerprint to be captured
-            while True:
-                capture = self.zkfp2.AcquireFingerprint()
-                if capture:
-                    # Break the loop once a fingerprint is captured
-                    tmp, img = capture
-
-                    # Display the fingerprint capture in the UI
-                    buffered = BytesIO()
-                    image = Image.frombytes("L", (288, 375), img)
-                    image.save(buffered, format="PNG")
-                    img_base64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
-
-                    lottie_container.content = ft.Image(
-                        src_base64=img_base64,  # Display the captured image
-                    )
-                    lottie_container.update()
-
-                    break
-                self.logger.info("Waiting for fingerprint...")  # Optional logging for debugging
-                sleep(0.5)  # Add a short delay to avoid excessive CPU usage
+            tmp, img = self._acquire_fingerprint()
 
-            # Identify fingerprint by matching with stored templates
+            # Identify first: matching the small template is cheap, so the
+            # preview encode is only paid when there is a result to show
             fid, score = self.zkfp2.DBIdentify(tmp)
             if fid != 0:
+                # Display the matched capture in the UI
+                lottie_container.content = ft.Image(
+                    src_base64=self._img_to_base64_preview(img),
+                )
+                lottie_container.update()
+
                 self.logger.info(f"User identified: {fid}, Score: {score}")
                 self.show_dialog(page, "User Identified", f"User ID: {fid}, Score: {score}.", json_file='fingerok.json',
                                  repeat=False)
                 text_display.value = "Place your finger on the device!"
                 text_display.update()
             else:
-                # If fingerprint is not found in the device, check if it's in the database
-                user_id = self.get_next_user_id()  # Get the next user_id to verify against the DB
-                with self.db_lock:
-                    self.db_cursor.execute("SELECT * FROM fingerprints WHERE user_id = ?", (user_id,))
-                    row = self.db_cursor.fetchone()
-
-                if row:
-                    # If found in the DB but not in the device, add it to the device
-                    fingerprint_template = row[1]
-                    decoded_template = base64.b64decode(fingerprint_template)
-                    self.zkfp2.DBAdd(user_id, decoded_template)
-                    self.logger.info(f"User {user_id}'s fingerprint added from the database to the device.")
-                    self.show_dialog(page, "User Found in Database",
-                                     f"User ID: {user_id} fingerprint was added to the device.",
-                                     json_file='fingerok.json', repeat=False)
-                else:
-                    # Fingerprint is not registered
-                    self.show_dialog(page, "Identification Failed", "Fingerprint not recognized.",
-                                     json_file='fingernok.json', repeat=False)
-                    self.logger.info("Identification failed. Fingerprint not recognized.")
+                # Every stored template is loaded into the device at connect
+                # (tracked in self._loaded_ids), so a miss here means the
+                # fingerprint is simply not registered
+                self.show_dialog(page, "Identification Failed", "Fingerprint not recognized.",
+                                 json_file='fingernok.json', repeat=False)
+                self.logger.info("Identification failed. Fingerprint not recognized.")
 
             text_display.update()
 